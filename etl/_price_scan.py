@@ -0,0 +1,102 @@
+from __future__ import annotations
+# Numba kernel behind utils.parse_price_currency_vec. Importing this module fails without numba,
+# in which case utils keeps using the Series.str.extract path.
+import numpy as np
+from numba import njit, prange
+
+# Status codes per value
+NO_MATCH = 0      # no ASCII digit: _price_re would not match either
+PARSED = 1
+UNSURE = 2        # non-ASCII whitespace before the digits or too many digits: let the regex decide
+
+# Currency codes, index into CURRENCIES
+CURRENCIES = np.array([None, "USD", "EUR", "GBP", "JPY"], dtype=object)
+
+@njit(cache=True)
+def _is_space(b: int) -> bool:
+    # Python's \s over ASCII: \t\n\v\f\r, space and the \x1c-\x1f separators
+    return b == 0x20 or 0x09 <= b <= 0x0D or 0x1C <= b <= 0x1F
+
+@njit(cache=True)
+def _is_digit(b: int) -> bool:
+    return 0x30 <= b <= 0x39
+
+@njit(cache=True)
+def _ends_with_unicode_space(data: np.ndarray, start: int, k: int) -> bool:
+    # UTF-8 encodings of the non-ASCII characters Python's \s matches, ending at byte k
+    b = data[k]
+    if k - 1 >= start and data[k - 1] == 0xC2 and (b == 0x85 or b == 0xA0):
+        return True
+    if k - 2 < start:
+        return False
+    b0, b1 = data[k - 2], data[k - 1]
+    if b0 == 0xE2 and b1 == 0x80:
+        return 0x80 <= b <= 0x8A or b == 0xA8 or b == 0xA9 or b == 0xAF
+    return ((b0 == 0xE1 and b1 == 0x9A and b == 0x80) or (b0 == 0xE2 and b1 == 0x81 and b == 0x9F)
+            or (b0 == 0xE3 and b1 == 0x80 and b == 0x80))
+
+@njit(cache=True, parallel=True)
+def scan_prices(data: np.ndarray, offsets: np.ndarray):
+    """Scan UTF-8 strings (Arrow large_string buffers) the way _price_re.search does.
+
+    Returns (price float64, currency code int8, status int8) per string. The leftmost match of
+    ([$€£¥])?\\s*([0-9]+(?:[.,][0-9]{1,2})?) always starts its digits at the first ASCII digit, and
+    captures a symbol iff the whitespace run before that digit is preceded by one.
+    """
+    n = len(offsets) - 1
+    prices = np.full(n, np.nan)
+    codes = np.zeros(n, dtype=np.int8)
+    status = np.zeros(n, dtype=np.int8)
+    for i in prange(n):
+        start, end = offsets[i], offsets[i + 1]
+        j = start
+        while j < end and not _is_digit(data[j]):
+            j += 1
+        if j == end:
+            continue
+
+        # Currency symbol before the (optional) whitespace run
+        k = j - 1
+        while k >= start and _is_space(data[k]):
+            k -= 1
+        code = 0
+        unsure = False
+        if k >= start and data[k] >= 0x80:
+            if k - 2 >= start and data[k - 2] == 0xE2 and data[k - 1] == 0x82 and data[k] == 0xAC:
+                code = 2    # €
+            elif k - 1 >= start and data[k - 1] == 0xC2 and data[k] == 0xA3:
+                code = 3    # £
+            elif k - 1 >= start and data[k - 1] == 0xC2 and data[k] == 0xA5:
+                code = 4    # ¥
+            elif _ends_with_unicode_space(data, start, k):
+                unsure = True   # \s would skip it and possibly reach a symbol
+        elif k >= start and data[k] == 0x24:
+            code = 1        # $
+
+        # [0-9]+(?:[.,][0-9]{1,2})? with ',' dropped, as parse_price_currency does
+        value = 0
+        ndigits = 0
+        while j < end and _is_digit(data[j]):
+            value = value * 10 + (data[j] - 0x30)
+            ndigits += 1
+            j += 1
+        scale = 1
+        if j + 1 < end and (data[j] == 0x2E or data[j] == 0x2C) and _is_digit(data[j + 1]):
+            decimal = data[j] == 0x2E
+            j += 1
+            nfrac = 0
+            while j < end and nfrac < 2 and _is_digit(data[j]):
+                value = value * 10 + (data[j] - 0x30)
+                ndigits += 1
+                nfrac += 1
+                j += 1
+            if decimal:
+                scale = 10 ** nfrac
+        if unsure or ndigits > 15:
+            status[i] = UNSURE
+            continue
+        # Both operands are exact below 2**53, so the division rounds like float("12.34")
+        prices[i] = value / scale
+        codes[i] = code
+        status[i] = PARSED
+    return prices, codes, status
@@ -1,103 +1,62 @@
 from __future__ import annotations
 import pandas as pd
 from pathlib import Path
-from .utils import md5_id, normalize_text, parse_price_currency, to_json_text, append_df
+from .utils import md5_id_vec, normalize_text_vec, parse_price_currency_vec, attrs_json, frame_from_columns, append_df, read_csv
+
+def _build_items(df: pd.DataFrame, table: str, merchant: str, site: str, brand_col: str|None=None) -> pd.DataFrame:
+    # One side (Abt = tablea, Buy = tableb) of the items table
+    n = len(df)
+    # TableA has no price column; the row-wise loader used to get None from r.get("price")
+    price, currency = parse_price_currency_vec(df["price"]) if "price" in df.columns else (None, None)
+    known = ("id","name","description","price") + ((brand_col,) if brand_col else ())
+    cols = dict(
+        item_id = md5_id_vec("abt_buy", table, df["id"]),
+        dataset = "abt_buy",
+        dataset_item_key = merchant + ":" + df["id"].astype(str),
+        merchant = merchant,
+        site = site,
+        locale = None,
+        brand = df[brand_col].astype("category") if brand_col else None,
+        title = normalize_text_vec(df["name"]),
+        description = normalize_text_vec(df["description"]),
+        bullet_points = None,
+        color = None,
+        price = price,
+        currency = currency.astype("category") if currency is not None else None,
+        category = None,
+        image_url = None,
+        attrs = attrs_json(df, known),
+        split = None,
+        variant = None,
+        version = None,
+    )
+    return frame_from_columns(cols, n)
 
 def load_abt_buy(con, data_dir: str):
     d = Path(data_dir)
 
     # Read TableA.csv: no header row, three columns.
-    abt = pd.read_csv(d / "TableA.csv", sep="\t", header=None,
-                      names=["id", "name", "description"])
+    abt = read_csv(d / "TableA.csv", sep="\t", header=None,
+                   names=["id", "name", "description"])
 
     # Read TableB.csv: no header row, five columns.
-    buy = pd.read_csv(d / "TableB.csv", sep="\t", header=None,
-                      names=["id", "name", "description", "manufacturer", "price"])
+    buy = read_csv(d / "TableB.csv", sep="\t", header=None,
+                   names=["id", "name", "description", "manufacturer", "price"])
 
     # Read matches.csv: no header row, two columns.
-    mapping = pd.read_csv(d / "matches.csv", sep="\t", header=None,
-                          names=["tableA_id", "tableB_id"])
-
-    #Normalize column names to lowercase so that downstream code still calls r.get("name"), etc.
-    abt.columns = [c.lower() for c in abt.columns]
-    buy.columns = [c.lower() for c in buy.columns]
-    mapping.columns = [c.lower() for c in mapping.columns]
-    # Items: Abt
-    abt_rows = []
-    for _, r in abt.iterrows():
-        price, currency = parse_price_currency(r.get("price"))
-        abt_rows.append(dict(
-            item_id = md5_id("abt_buy","tablea", r.get("id")),
-            dataset = "abt_buy",
-            dataset_item_key = f"abt:{r.get('id')}",
-            merchant = "abt",
-            site = "abt.com",
-            locale = None,
-            brand = None,
-            title = normalize_text(r.get("name")),
-            description = normalize_text(r.get("description")),
-            bullet_points = None,
-            color = None,
-            price = price,
-            currency = currency,
-            category = None,
-            image_url = None,
-            attrs = to_json_text({k:v for k,v in r.items() if k not in ('id','name','description','price')}),
-            split = None,
-            variant = None,
-            version = None,
-        ))
-    abt_df = pd.DataFrame(abt_rows)
-
-    # Items: Buy
-    buy_rows = []
-    for _, r in buy.iterrows():
-        price, currency = parse_price_currency(r.get("price"))
-        buy_rows.append(dict(
-            item_id = md5_id("abt_buy","tableb", r.get("id")),
-            dataset = "abt_buy",
-            dataset_item_key = f"buy:{r.get('id')}",
-            merchant = "buy",
-            site = "buy.com",
-            locale = None,
-            brand = r.get("manufacturer"),
-            title = normalize_text(r.get("name")),
-            description = normalize_text(r.get("description")),
-            bullet_points = None,
-            color = None,
-            price = price,
-            currency = currency,
-            category = None,
-            image_url = None,
-            attrs = to_json_text({k:v for k,v in r.items() if k not in ('id','name','description','price','manufacturer')}),
-            split = None,
-            variant = None,
-            version = None,
-        ))
-    buy_df = pd.DataFrame(buy_rows)
-
-    items_df = pd.concat([abt_df, buy_df], ignore_index=True)
-    # Create tables if needed
-    con.execute("CREATE TABLE IF NOT EXISTS items AS SELECT * FROM items WHERE 1=0")
-    con.execute("CREATE TABLE IF NOT EXISTS item_item_pairs AS SELECT * FROM item_item_pairs WHERE 1=0")
-
-    append_df(con, "items", items_df)
-
-    # Pairs
-    # mapping has columns like idabt, idbuy
-    left_ids = mapping.columns[0]
-    right_ids = mapping.columns[1]
-    pair_rows = []
-    for _, r in mapping.iterrows():
-        left = md5_id("abt_buy","tablea", r.get(left_ids))
-        right = md5_id("abt_buy","tableb", r.get(right_ids))
-        pair_rows.append(dict(
-            left_item_id = left,
-            right_item_id = right,
-            label = "match",
-            pair_source = "gold",
-            split = None,
-            variant = None
-        ))
-    pair_df = pd.DataFrame(pair_rows)
+    mapping = read_csv(d / "matches.csv", sep="\t", header=None,
+                       names=["tablea_id", "tableb_id"])
+    # Items: one INSERT per side instead of concatenating them first
+    append_df(con, "items", _build_items(abt, "tablea", "abt", "abt.com"))
+    append_df(con, "items", _build_items(buy, "tableb", "buy", "buy.com", brand_col="manufacturer"))
+
+    # Pairs: straight from the mapping columns, no join against the item frames needed
+    pair_df = frame_from_columns(dict(
+        left_item_id = md5_id_vec("abt_buy","tablea", mapping["tablea_id"]),
+        right_item_id = md5_id_vec("abt_buy","tableb", mapping["tableb_id"]),
+        label = "match",
+        pair_source = "gold",
+        split = None,
+        variant = None
+    ), len(mapping))
     append_df(con, "item_item_pairs", pair_df)
@@ -1,8 +1,25 @@
 from __future__ import annotations
+import csv, os, tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from tqdm import tqdm
-from .utils import md5_id, normalize_text, parse_price_currency, to_json_text, append_df
+from .utils import md5_id_vec, normalize_text_vec, parse_price_currency_vec, attrs_json, frame_from_columns, append_df, read_csv
+
+# Interaction logs are streamed in blocks of this many bytes
+_BLOCK_SIZE = 64 << 20
+
+_INTERACTION_LOGS = (
+    ("train-item-views.csv", "view"),       # browse/click/view log
+    ("train-clicks.csv", "click"),
+    ("train-purchases.csv", "purchase"),
+)
 
 def _load_products(con, d: Path):
     # products.csv and product-categories.csv are expected, but columns vary across mirrors.
@@ -10,7 +27,7 @@ def _load_products(con, d: Path):
     cat_path = d / "product-categories.csv"
     if not prod_path.exists():
         raise FileNotFoundError(f"Missing {prod_path}")
-    prods = pd.read_csv(prod_path)
+    prods = read_csv(prod_path)
     prods.columns = [c.strip() for c in prods.columns]
 
     # Best-effort column detection
@@ -23,46 +40,43 @@ def _load_products(con, d: Path):
     cats = None
     cat_map = {}
     if cat_path.exists():
-        cats = pd.read_csv(cat_path)
+        cats = read_csv(cat_path)
         cats.columns = [c.strip() for c in cats.columns]
         pid_col = next((c for c in cats.columns if c.lower() in ("productid","product_id","itemid","item_id","id")), None)
         cat_col = next((c for c in cats.columns if "category" in c.lower()), None)
         if pid_col and cat_col:
             cat_map = dict(zip(cats[pid_col].astype(str), cats[cat_col].astype(str)))
 
-    rows = []
-    for _, r in prods.iterrows():
-        pid = str(r.get(id_col))
-        price, currency = parse_price_currency(r.get(price_col)) if price_col else (None,None)
-        rows.append(dict(
-            item_id = md5_id("cikm16", pid),
-            dataset = "cikm16",
-            dataset_item_key = pid,
-            merchant = None,
-            site = None,
-            locale = None,
-            brand = r.get(brand_col) if brand_col else None,
-            title = normalize_text(r.get(title_col)) if title_col else None,
-            description = normalize_text(r.get(desc_col)) if desc_col else None,
-            bullet_points = None,
-            color = None,
-            price = price,
-            currency = currency,
-            category = cat_map.get(pid),
-            image_url = None,
-            attrs = to_json_text({k:v for k,v in r.items() if k not in (id_col, title_col, desc_col, brand_col, price_col)}),
-            split = "train",
-            variant = None,
-            version = None,
-        ))
-    items_df = pd.DataFrame(rows)
+    pids = prods[id_col].astype(str)
+    prices, currencies = parse_price_currency_vec(prods[price_col]) if price_col else (None, None)
+    items_df = frame_from_columns(dict(
+        item_id = md5_id_vec("cikm16", pids),
+        dataset = "cikm16",
+        dataset_item_key = pids,
+        merchant = None,
+        site = None,
+        locale = None,
+        brand = prods[brand_col].astype("category") if brand_col else None,
+        title = normalize_text_vec(prods[title_col]) if title_col else None,
+        description = normalize_text_vec(prods[desc_col]) if desc_col else None,
+        bullet_points = None,
+        color = None,
+        price = prices,
+        currency = currencies.astype("category") if currencies is not None else None,
+        category = pids.map(cat_map).astype("category"),
+        image_url = None,
+        attrs = attrs_json(prods, (id_col, title_col, desc_col, brand_col, price_col)),
+        split = "train",
+        variant = None,
+        version = None,
+    ), len(prods))
     append_df(con, "items", items_df)
 
 def _load_queries(con, d: Path):
     q_path = d / "train-queries.csv"
     if not q_path.exists():
         return
-    q = pd.read_csv(q_path)
+    q = read_csv(q_path)
     q.columns = [c.strip() for c in q.columns]
     # Heuristic columns
     qid = next((c for c in q.columns if "queryid" in c.lower()), None)
@@ -72,59 +86,95 @@ def _load_queries(con, d: Path):
     sess = next((c for c in q.columns if "session" in c.lower()), None)
     evdate = next((c for c in q.columns if "eventdate" in c.lower() or "event_date" in c.lower()), None)
 
-    rows = []
-    for _, r in q.iterrows():
-        native_qid = str(r.get(qid)) if qid else normalize_text(r.get(qtxt)) or None
-        qid_g = md5_id("cikm16", native_qid)
-        rows.append(dict(
-            query_id = qid_g,
-            dataset = "cikm16",
-            query_text = normalize_text(r.get(qtxt)) if qtxt else None,
-            locale = r.get(locale) if locale else None,
-            query_type = ("queryless" if (qless and r.get(qless)) else "full"),
-            source = "train-queries",
-            session_id = str(r.get(sess)) if sess else None,
-            event_date = str(r.get(evdate)) if evdate else None,
-        ))
-    q_df = pd.DataFrame(rows)
+    query_text = normalize_text_vec(q[qtxt]) if qtxt else None
+    if qid:
+        native_qid = q[qid].astype(str)
+    elif qtxt:
+        native_qid = query_text.where(query_text != "", None)
+    else:
+        native_qid = pd.Series(None, index=q.index, dtype=object)
+    q_df = frame_from_columns(dict(
+        query_id = md5_id_vec("cikm16", native_qid),
+        dataset = "cikm16",
+        query_text = query_text,
+        locale = q[locale] if locale else None,
+        query_type = q[qless].fillna(False).astype(bool).map({True: "queryless", False: "full"}) if qless else "full",
+        source = "train-queries",
+        session_id = q[sess].astype(str) if sess else None,
+        event_date = q[evdate].astype(str) if evdate else None,
+    ), len(q))
     append_df(con, "queries", q_df)
 
-def _load_interactions(con, d: Path, fname: str, label_family: str):
-    p = d / fname
-    if not p.exists():
-        return
-    chunks = pd.read_csv(p, chunksize=1_000_000)
-    for ch in tqdm(chunks, desc=f"cikm16:{label_family}"):
-        ch.columns = [c.strip() for c in ch.columns]
-        qid = next((c for c in ch.columns if "queryid" in c.lower()), None)
-        sess = next((c for c in ch.columns if "session" in c.lower()), None)
-        item = next((c for c in ch.columns if c.lower() in ("itemid","productid","item_id","product_id")), None)
-        timeframe = next((c for c in ch.columns if "timeframe" in c.lower()), None)
-        pos = next((c for c in ch.columns if c.lower() in ("position","rank")), None)
+def _constant_str(value: str, n: int) -> pa.DictionaryArray:
+    # Dictionary-encoded so the shard carries one string plus n int8 codes
+    return pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int8)), pa.array([value]))
+
+def _interaction_ids(arr) -> pa.Array:
+    # md5 over the string form of each native id (as str() did row-wise); missing ids stay NULL
+    native = arr.to_pandas()
+    return pa.array(md5_id_vec("cikm16", native).where(native.notna(), None), type=pa.string())
 
-        rows = []
-        for _, r in ch.iterrows():
-            native_qid = str(r.get(qid)) if qid else str(r.get(sess)) if sess else None
-            gid = md5_id("cikm16", native_qid) if native_qid else None
-            iid_native = str(r.get(item)) if item else None
-            iid = md5_id("cikm16", iid_native) if iid_native else None
-            rows.append(dict(
-                query_id = gid,
-                item_id = iid,
-                label_family = label_family,
-                label = 1 if label_family in ("click","purchase","view") else None,
-                position = int(r.get(pos)) if pos is not None and pd.notna(r.get(pos)) else None,
-                session_id = str(r.get(sess)) if sess else None,
-                timeframe_ms = int(r.get(timeframe)) if timeframe and pd.notna(r.get(timeframe)) else None,
-                split = "train"
-            ))
-        df = pd.DataFrame(rows)
-        append_df(con, "query_item_labels", df)
+def _csv_header(src: str) -> list[str]:
+    with open(src, "rb") as f:
+        return next(csv.reader([f.readline().decode("utf-8-sig")]), [])
+
+def _convert_interactions(src: str, label_family: str, dest: str) -> str|None:
+    # Runs in a worker process: stream one log as Arrow batches and write the label rows to a parquet shard
+    raw = _csv_header(src)
+    names = {c.strip(): c for c in raw}
+    qid = next((c for c in names if "queryid" in c.lower()), None)
+    sess = next((c for c in names if "session" in c.lower()), None)
+    item = next((c for c in names if c.lower() in ("itemid","productid","item_id","product_id")), None)
+    timeframe = next((c for c in names if "timeframe" in c.lower()), None)
+    pos = next((c for c in names if c.lower() in ("position","rank")), None)
+    label = 1 if label_family in ("click","purchase","view") else None
+
+    # Types are fixed up front: open_csv infers them from the first block only, so a column that is
+    # empty there and filled later would abort the whole load. Unused columns are never converted.
+    types = {**{names[c]: pa.string() for c in (qid, sess, item) if c},
+             **{names[c]: pa.float64() for c in (pos, timeframe) if c}}
+    reader = pacsv.open_csv(src, read_options=pacsv.ReadOptions(block_size=_BLOCK_SIZE),
+                            convert_options=pacsv.ConvertOptions(include_columns=list(types) or raw,
+                                                                 column_types=types, strings_can_be_null=True))
+    writer = None
+    for batch in reader:
+        n = batch.num_rows
+        cols = {c.strip(): a for c, a in zip(batch.schema.names, batch.columns)}
+        native_qid = qid or sess
+        table = pa.Table.from_arrays([
+            _interaction_ids(cols[native_qid]) if native_qid else pa.nulls(n, pa.string()),
+            _interaction_ids(cols[item]) if item else pa.nulls(n, pa.string()),
+            _constant_str(label_family, n),
+            pa.repeat(pa.scalar(label, pa.int64()), n),
+            pc.cast(cols[pos], pa.int64(), safe=False) if pos else pa.nulls(n, pa.int64()),
+            cols[sess] if sess else pa.nulls(n, pa.string()),
+            pc.cast(cols[timeframe], pa.int64(), safe=False) if timeframe else pa.nulls(n, pa.int64()),
+            _constant_str("train", n),
+        ], names=["query_id","item_id","label_family","label","position","session_id","timeframe_ms","split"])
+        if writer is None:
+            writer = pq.ParquetWriter(dest, table.schema)
+        writer.write_table(table)
+    if writer is None:
+        return None
+    writer.close()
+    return dest
+
+def _load_interactions(con, d: Path):
+    # One worker process per log (parsing + hashing is CPU-bound); DuckDB stays single-writer in this process
+    jobs = [(d / fname, family) for fname, family in _INTERACTION_LOGS if (d / fname).exists()]
+    if not jobs:
+        return
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(
+            max_workers=min(len(jobs), os.cpu_count() or 1), mp_context=mp.get_context("spawn")) as pool:
+        futures = [pool.submit(_convert_interactions, str(p), family, os.path.join(tmp, f"{family}.parquet"))
+                   for p, family in jobs]
+        for fut in tqdm(futures, desc="cikm16:interactions"):
+            shard = fut.result()
+            if shard:
+                con.execute("INSERT INTO query_item_labels SELECT * FROM read_parquet(?)", [shard])
 
 def load_cikm16(con, data_dir: str):
     d = Path(data_dir)
     _load_products(con, d)
     _load_queries(con, d)
-    _load_interactions(con, d, "train-item-views.csv", "view")       # browse/click/view log
-    _load_interactions(con, d, "train-clicks.csv", "click")
-    _load_interactions(con, d, "train-purchases.csv", "purchase")
+    _load_interactions(con, d)
@@ -1,5 +1,3 @@
-PRAGMA threads=4;
-
 CREATE TABLE IF NOT EXISTS items (
   item_id TEXT PRIMARY KEY,
   dataset TEXT,
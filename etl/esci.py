@@ -1,84 +1,85 @@
 from __future__ import annotations
 from pathlib import Path
-import pandas as pd
-from .utils import md5_id, normalize_text, to_json_text, append_df
+from .utils import attrs_sql, describe_columns
+
+_PRODUCT_COLS = ("product_id","product_locale","product_brand","product_title","product_description","product_bullet_point","product_color")
+
+def _col_or_null(name: str, cols: set[str]) -> str:
+    # r.get(name) semantics: optional columns read as NULL when absent
+    return name if name in cols else "NULL"
 
 def load_esci(con, data_dir: str):
+    # The whole transform runs inside DuckDB: parquet/CSV are scanned natively and never go through pandas.
+    # normalize_text is the UDF registered by connect_duckdb.
     d = Path(data_dir)
-    products_pq = d / "shopping_queries_dataset_products.parquet"
-    examples_pq = d / "shopping_queries_dataset_examples.parquet"
+    products_pq = str(d / "shopping_queries_dataset_products.parquet")
+    examples_pq = str(d / "shopping_queries_dataset_examples.parquet")
     sources_csv = d / "shopping_queries_dataset_sources.csv"
 
-    prods = pd.read_parquet(products_pq)
-    ex = pd.read_parquet(examples_pq)
-    src = pd.read_csv(sources_csv) if sources_csv.exists() else pd.DataFrame(columns=["query_id","source"])
-
-    # Normalize column names
-    prods.columns = [c.strip().lower() for c in prods.columns]
-    ex.columns = [c.strip().lower() for c in ex.columns]
-    src.columns = [c.strip().lower() for c in src.columns]
+    prod_names = describe_columns(con, "read_parquet(?)", [products_pq])
+    prod_cols = {c.strip().lower() for c in prod_names}
+    ex_cols = {c.strip().lower() for c in describe_columns(con, "read_parquet(?)", [examples_pq])}
 
     # Items
-    rows = []
-    for _, r in prods.iterrows():
-        pid = str(r["product_id"])
-        loc = r["product_locale"]
-        rows.append(dict(
-            item_id = md5_id("esci", loc, pid),
-            dataset = "esci",
-            dataset_item_key = f"{loc}:{pid}",
-            merchant = None,
-            site = None,
-            locale = loc,
-            brand = r.get("product_brand"),
-            title = normalize_text(r.get("product_title")),
-            description = normalize_text(r.get("product_description")),
-            bullet_points = normalize_text(r.get("product_bullet_point")),
-            color = r.get("product_color"),
-            price = None,
-            currency = None,
-            category = None,
-            image_url = None,
-            attrs = to_json_text({k:v for k,v in r.items() if k not in ("product_id","product_locale","product_brand","product_title","product_description","product_bullet_point","product_color")}),
-            split = None,
-            variant = None,
-            version = None,
-        ))
-    items_df = pd.DataFrame(rows)
-    append_df(con, "items", items_df)
+    con.execute(f"""
+        INSERT INTO items
+        SELECT
+            md5(concat('esci|', product_locale, '|', product_id, '|')) AS item_id,
+            'esci' AS dataset,
+            concat(product_locale, ':', product_id) AS dataset_item_key,
+            NULL AS merchant,
+            NULL AS site,
+            product_locale AS locale,
+            {_col_or_null("product_brand", prod_cols)} AS brand,
+            normalize_text({_col_or_null("product_title", prod_cols)}) AS title,
+            normalize_text({_col_or_null("product_description", prod_cols)}) AS description,
+            normalize_text({_col_or_null("product_bullet_point", prod_cols)}) AS bullet_points,
+            {_col_or_null("product_color", prod_cols)} AS color,
+            NULL AS price,
+            NULL AS currency,
+            NULL AS category,
+            NULL AS image_url,
+            {attrs_sql(prod_names, _PRODUCT_COLS)} AS attrs,
+            NULL AS split,
+            NULL AS variant,
+            NULL AS version
+        FROM read_parquet(?)
+    """, [products_pq])
 
-    # Queries
-    src_map = dict(zip(src["query_id"].astype(str), src["source"])) if len(src) else {}
-    qrows = []
-    for _, r in ex.iterrows():
-        qid_native = str(r["query_id"])
-        qrows.append(dict(
-            query_id = md5_id("esci", qid_native),
-            dataset = "esci",
-            query_text = normalize_text(r["query"]),
-            locale = r["product_locale"],
-            query_type = "full",
-            source = src_map.get(qid_native),
-            session_id = None,
-            event_date = None,
-        ))
-    q_df = pd.DataFrame(qrows).drop_duplicates(subset=["query_id"])
-    append_df(con, "queries", q_df)
+    # Queries: first example row per query, source joined from the optional sources file
+    if sources_csv.exists():
+        sources = "(SELECT query_id, any_value(source) AS source FROM read_csv_auto(?, header=true, all_varchar=true) GROUP BY query_id)"
+        params = [examples_pq, str(sources_csv)]
+    else:
+        sources = "(SELECT NULL::VARCHAR AS query_id, NULL::VARCHAR AS source WHERE false)"
+        params = [examples_pq]
+    con.execute(f"""
+        INSERT INTO queries
+        SELECT
+            md5(concat('esci|', e.query_id, '|')) AS query_id,
+            'esci' AS dataset,
+            normalize_text(e.query) AS query_text,
+            e.product_locale AS locale,
+            'full' AS query_type,
+            s.source AS source,
+            NULL AS session_id,
+            NULL AS event_date
+        FROM read_parquet(?, file_row_number=true) e
+        LEFT JOIN {sources} s ON s.query_id = CAST(e.query_id AS VARCHAR)
+        QUALIFY row_number() OVER (PARTITION BY CAST(e.query_id AS VARCHAR) ORDER BY e.file_row_number) = 1
+    """, params)
 
     # Labels
-    lrows = []
-    for _, r in ex.iterrows():
-        qid = md5_id("esci", str(r["query_id"]))
-        iid = md5_id("esci", r["product_locale"], str(r["product_id"]))
-        lrows.append(dict(
-            query_id = qid,
-            item_id = iid,
-            label_family = "ESCI",
-            label = r["esci_label"],
-            position = None,
-            session_id = None,
-            timeframe_ms = None,
-            split = r.get("split")
-        ))
-    l_df = pd.DataFrame(lrows)
-    append_df(con, "query_item_labels", l_df)
+    con.execute(f"""
+        INSERT INTO query_item_labels
+        SELECT
+            md5(concat('esci|', query_id, '|')) AS query_id,
+            md5(concat('esci|', product_locale, '|', product_id, '|')) AS item_id,
+            'ESCI' AS label_family,
+            esci_label AS label,
+            NULL AS position,
+            NULL AS session_id,
+            NULL AS timeframe_ms,
+            {_col_or_null("split", ex_cols)} AS split
+        FROM read_parquet(?)
+    """, [examples_pq])
@@ -1,9 +1,26 @@
 from __future__ import annotations
-import re, json, hashlib, unicodedata
-from typing import Any, Dict, Iterable, Optional
+import os, re, json, hashlib, unicodedata
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import duckdb
 
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+try:
+    from . import _price_scan
+except ImportError:  # numba is optional
+    _price_scan = None
+
+# Below this many prices the numba JIT/dispatch cost outweighs the faster scan
+_SCAN_MIN_ROWS = 10_000
+
 def md5_id(*parts: str) -> str:
     h = hashlib.md5()
     for p in parts:
@@ -13,6 +30,38 @@ def md5_id(*parts: str) -> str:
         h.update(b"|")
     return h.hexdigest()
 
+def _id_columns(parts) -> tuple[pd.Index, list[pd.Series]]:
+    # Broadcast scalar parts against the first Series part; missing values hash like None ("")
+    index = next((p.index for p in parts if isinstance(p, pd.Series)), None)
+    if index is None:
+        raise ValueError("at least one part must be a pandas Series")
+    cols = []
+    for p in parts:
+        if isinstance(p, pd.Series):
+            cols.append(p.astype(object).where(p.notna(), "").astype(str))
+        else:
+            cols.append(pd.Series("" if p is None else str(p), index=index))
+    return index, cols
+
+def md5_id_vec(*parts) -> pd.Series:
+    """Column-wise md5_id: same ids, but the '|'-joined keys are built in one pass per column."""
+    index, cols = _id_columns(parts)
+    joined = cols[0].str.cat(cols[1:], sep="|") + "|"
+    hashed = np.fromiter((hashlib.md5(s.encode("utf-8")).hexdigest() for s in joined),
+                         dtype="U32", count=len(joined))
+    return pd.Series(hashed, index=index, dtype=object)
+
+def fast_id_vec(*parts) -> pd.Series:
+    """Non-cryptographic 64-bit ids via pandas' hash_pandas_object.
+
+    Much faster than md5_id_vec, but the ids differ from md5_id, so only use it for
+    keys that never have to match ids produced by another loader.
+    """
+    index, cols = _id_columns(parts)
+    h = pd.util.hash_pandas_object(pd.concat(cols, axis=1, ignore_index=True), index=False)
+    hexed = np.frombuffer(h.to_numpy().astype(">u8").tobytes().hex().encode("ascii"), dtype="S16")
+    return pd.Series(hexed.astype("U16"), index=index, dtype=object)
+
 _ws_re = re.compile(r"\s+")
 _tag_re = re.compile(r"<[^>]+>")
 
@@ -25,6 +74,26 @@ def normalize_text(s: Optional[str]) -> Optional[str]:
     s = _ws_re.sub(" ", s).strip()
     return s
 
+# RE2 (pyarrow's regex engine) only treats ASCII [\t\n\f\r ] as \s; this is Python's str \s
+_ws_re2 = r"[\s\x{0b}\x{1c}-\x{1f}\x{85}\p{Z}]+"
+
+def normalize_text_arrow(arr: pa.Array | pa.ChunkedArray) -> pa.Array | pa.ChunkedArray:
+    """normalize_text over an Arrow string array with pyarrow compute kernels; nulls stay null."""
+    # Null slots are skipped via the validity bitmap, but empty strings still run every kernel;
+    # descriptions/brands are often empty in retail data, so mask them out as nulls and put them back
+    empty = pc.equal(pc.binary_length(arr), 0)
+    if pc.any(empty).as_py():
+        return pc.if_else(empty, arr, normalize_text_arrow(pc.if_else(empty, pa.scalar(None, arr.type), arr)))
+    arr = pc.utf8_normalize(arr, form="NFKC")
+    arr = pc.replace_substring_regex(arr, pattern=_tag_re.pattern, replacement=" ")
+    arr = pc.replace_substring_regex(arr, pattern=_ws_re2, replacement=" ")
+    return pc.utf8_trim(arr, characters=" ")
+
+def normalize_text_vec(s: pd.Series) -> pd.Series:
+    """Column-wise normalize_text; missing values stay missing."""
+    arr = pa.array(s.astype(pd.StringDtype("pyarrow")), type=pa.large_string())
+    return pd.Series(normalize_text_arrow(arr), index=s.index, dtype=pd.ArrowDtype(pa.large_string()))
+
 _cur_map = {
     "$": "USD",
     "€": "EUR",
@@ -32,7 +101,7 @@ _cur_map = {
     "¥": "JPY",
 }
 
-_price_re = re.compile(r"([$\€£¥])?\s*([0-9]+(?:[.,][0-9]{1,2})?)")
+_price_re = re.compile(r"([$€£¥])?\s*([0-9]+(?:[.,][0-9]{1,2})?)")
 
 def parse_price_currency(raw: Optional[str]) -> tuple[Optional[float], Optional[str]]:
     if raw is None:
@@ -52,17 +121,170 @@ def parse_price_currency(raw: Optional[str]) -> tuple[Optional[float], Optional[
         return None, _cur_map.get(symbol or "", None)
     return val, _cur_map.get(symbol or "", None)
 
+def _float_or_nan(raw: Any) -> float:
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _already_numeric(s: pd.Series) -> np.ndarray:
+    # parse_price_currency's float(raw) fallback, column-wise: to_numeric handles the ASCII forms in C and
+    # float() retries only what it rejected, e.g. non-ASCII digits such as '２' or '١٢'
+    num = pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    retry = np.isnan(num) & s.notna().to_numpy()
+    if retry.any():
+        num[retry] = [_float_or_nan(v) for v in s.to_numpy(dtype=object)[retry]]
+    return num
+
+def _parse_price_currency_regex(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    m = s.astype(str).str.extract(_price_re.pattern)
+    # Matches are plain digit runs, so astype can't fail; unlike to_numeric's fast parser it rounds
+    # long digit runs exactly as float() does
+    num = m[1].str.replace(",", "", regex=False).astype("float64")
+    # Sometimes price is numeric already
+    price = num.where(m[1].notna(), pd.Series(_already_numeric(s), index=s.index)).astype("float64")
+    currency = m[0].map(_cur_map).astype(object)
+    return price, currency.where(currency.notna(), None)
+
+def _parse_price_currency_scan(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    # Numba byte scanner over the Arrow UTF-8 buffers; values it cannot settle go through the regex
+    arr = pa.array(s.astype(str), type=pa.large_string())
+    offsets = np.frombuffer(arr.buffers()[1], dtype=np.int64, count=len(arr) + 1)
+    data = np.frombuffer(arr.buffers()[2], dtype=np.uint8) if arr.buffers()[2] is not None else np.empty(0, np.uint8)
+    prices, codes, status = _price_scan.scan_prices(data, offsets)
+    currency = _price_scan.CURRENCIES[codes]
+    no_match = status == _price_scan.NO_MATCH
+    if no_match.any():
+        # Sometimes price is numeric already
+        prices[no_match] = _already_numeric(s[no_match])
+    unsure = status == _price_scan.UNSURE
+    if unsure.any():
+        sub_price, sub_currency = _parse_price_currency_regex(s[unsure])
+        prices[unsure] = sub_price.to_numpy()
+        currency[unsure] = sub_currency.to_numpy()
+    return pd.Series(prices, index=s.index), pd.Series(currency, index=s.index, dtype=object)
+
+def parse_price_currency_vec(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Column-wise parse_price_currency: one regex pass (or numba scan, when installed) over the whole column."""
+    mask = s.notna()
+    if not mask.all():
+        price = np.full(len(s), np.nan)
+        currency = np.full(len(s), None, dtype=object)
+        sub_price, sub_currency = parse_price_currency_vec(s[mask])
+        price[mask.to_numpy()] = sub_price.to_numpy()
+        currency[mask.to_numpy()] = sub_currency.to_numpy()
+        return pd.Series(price, index=s.index), pd.Series(currency, index=s.index, dtype=object)
+    if _price_scan is not None and len(s) >= _SCAN_MIN_ROWS:
+        return _parse_price_currency_scan(s)
+    return _parse_price_currency_regex(s)
+
 def to_json_text(d: Dict[str, Any]) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(d, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:  # e.g. ints beyond 64 bits or objects orjson does not know
+            pass
     return json.dumps(d, ensure_ascii=False, separators=(",", ":"))
 
+def read_csv(path, **kw) -> pd.DataFrame:
+    # pyarrow's parser is multithreaded; fall back to the C engine for inputs/options it rejects
+    try:
+        return pd.read_csv(path, engine="pyarrow", **kw)
+    except ValueError:
+        return pd.read_csv(path, **kw)
+
+def sql_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def describe_columns(con: duckdb.DuckDBPyConnection, relation: str, params: Optional[list] = None) -> list[str]:
+    return [r[0] for r in con.execute(f"DESCRIBE SELECT * FROM {relation}", params or []).fetchall()]
+
+def attrs_sql(columns: Iterable[str], known: Iterable[str]) -> str:
+    # SQL counterpart of to_json_text({k:v for k,v in r.items() if k not in known}); keys are lowercased
+    known = set(known)
+    extra = [c for c in columns if c.strip().lower() not in known]
+    if not extra:
+        return "'{}'"
+    fields = ", ".join(f"{sql_ident(c.strip().lower())} := {sql_ident(c)}" for c in extra)
+    return f"to_json(struct_pack({fields}))::VARCHAR"
+
+def _normalize_text_udf(s) -> pa.Array:
+    return pc.cast(normalize_text_arrow(s), pa.string())
+
+def _parse_price_currency_udf(raw) -> pa.StructArray:
+    price, currency = parse_price_currency_vec(raw.to_pandas())
+    return pa.StructArray.from_arrays(
+        [pa.array(price, pa.float64(), from_pandas=True), pa.array(currency, pa.string(), from_pandas=True)],
+        names=["price", "currency"])
+
+def register_functions(con: duckdb.DuckDBPyConnection):
+    # Expose the text/price helpers to SQL for loaders that transform inside DuckDB
+    con.create_function("normalize_text", _normalize_text_udf, ["VARCHAR"], "VARCHAR", type="arrow",
+                        null_handling="special")
+    con.create_function("parse_price_currency", _parse_price_currency_udf, ["VARCHAR"],
+                        "STRUCT(price DOUBLE, currency VARCHAR)", type="arrow", null_handling="special")
+
+def attrs_json(df: pd.DataFrame, known: Iterable[str]) -> pd.Series:
+    """Column-wise to_json_text({k:v for k,v in r.items() if k not in known}) for every row of df."""
+    known = set(known)
+    extra = [c for c in df.columns if c not in known]
+    if not extra:
+        return pd.Series(to_json_text({}), index=df.index, dtype=object)
+    records = df[extra].astype(object).where(df[extra].notna(), None).to_dict(orient="records")
+    return pd.Series(map(to_json_text, records), index=df.index, dtype=object)
+
+def column_arrays(cols: Dict[str, Any], n: int) -> Dict[str, np.ndarray | pd.Categorical]:
+    # One length-n array per output column: Series contribute their values, scalars are broadcast
+    out = {}
+    for c, v in cols.items():
+        if isinstance(v, pd.Series) and isinstance(v.dtype, pd.CategoricalDtype):
+            out[c] = v.array  # low-cardinality columns stay codes + categories
+        elif isinstance(v, pd.Series):
+            out[c] = v.to_numpy() if pd.api.types.is_numeric_dtype(v) else v.to_numpy(dtype=object, na_value=None)
+        elif isinstance(v, str):
+            # Constant strings (dataset, merchant, ...) as a one-category Categorical: n int8 codes
+            # instead of n object pointers, and an Arrow dictionary column on the way into DuckDB
+            out[c] = pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[v])
+        else:
+            out[c] = np.full(n, v, dtype=object)
+    return out
+
+def frame_from_columns(cols: Dict[str, Any], n: int) -> pd.DataFrame:
+    return pd.DataFrame(column_arrays(cols, n), copy=False)
+
 def connect_duckdb(path: str) -> duckdb.DuckDBPyConnection:
     con = duckdb.connect(path)
+    # Bulk-load settings: every core, and no ordering guarantee for INSERT ... SELECT we never rely on
+    con.execute(f"PRAGMA threads={os.cpu_count() or 1}")
+    con.execute("PRAGMA preserve_insertion_order=false")
+    # DuckDB defaults to 80% of RAM; RETAIL_BENCH_MEMORY_LIMIT (e.g. '8GB') caps it on shared machines
+    memory_limit = os.environ.get("RETAIL_BENCH_MEMORY_LIMIT")
+    if memory_limit:
+        con.execute("SET memory_limit = ?", [memory_limit])
+    register_functions(con)
     return con
 
-def append_df(con: duckdb.DuckDBPyConnection, table: str, df: pd.DataFrame):
-    if df is None or len(df) == 0:
+@contextmanager
+def transaction(con: duckdb.DuckDBPyConnection) -> Iterator[duckdb.DuckDBPyConnection]:
+    # One commit for all of a loader's appends; on error nothing of that loader is kept
+    con.begin()
+    try:
+        yield con
+    except BaseException:
+        con.rollback()
+        raise
+    con.commit()
+
+def append_df(con: duckdb.DuckDBPyConnection, table: str, df_or_table: pd.DataFrame | pa.Table):
+    if df_or_table is None or len(df_or_table) == 0:
         return
-    # ensure table exists
-    con.register("tmp_df", df)
+    # DuckDB scans Arrow zero-copy, so convert pandas frames once up front; Arrow input is passed through
+    data = df_or_table
+    if isinstance(data, pd.DataFrame):
+        try:
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass  # mixed-type object column: let DuckDB infer from pandas
+    con.register("tmp_df", data)
     con.execute(f"INSERT INTO {table} SELECT * FROM tmp_df")
     con.unregister("tmp_df")
@@ -1,136 +1,169 @@
 from __future__ import annotations
+import csv, gzip, os
+from fnmatch import fnmatchcase
 from pathlib import Path
-import pandas as pd
-from .utils import md5_id, normalize_text, parse_price_currency, to_json_text, append_df
+from .utils import attrs_sql, describe_columns, sql_ident
 
-def _detect_offers_file(dirpath: Path) -> Path|None:
-    for p in dirpath.glob("*.csv"):
-        try:
-            head = pd.read_csv(p, nrows=5)
-        except Exception:
-            continue
-        cols = [c.lower() for c in head.columns]
-        if all(k in cols for k in ["id","title","description","price","pricecurrency","brand"]):
-            return p
-    for p in dirpath.glob("*.tsv"):
+# (path, mtime_ns, sep) -> (header names as DuckDB reports them, lowercased names)
+_header_cache: dict[tuple[str, int, str], tuple[list[str], list[str]]] = {}
+
+def _header(p: Path, sep: str) -> tuple[list[str], list[str]]:
+    # Only the first line is needed to classify a file; memoized so rescans of a directory are free
+    try:
+        key = (str(p), p.stat().st_mtime_ns, sep)
+    except OSError:
+        return [], []
+    cached = _header_cache.get(key)
+    if cached is None:
         try:
-            head = pd.read_csv(p, nrows=5, sep="\t")
-        except Exception:
-            continue
-        cols = [c.lower() for c in head.columns]
-        if all(k in cols for k in ["id","title","description","price","pricecurrency","brand"]):
+            # read_csv_auto decompresses .gz from the extension, so the sniff has to as well
+            with (gzip.open(p, "rb") if p.suffix == ".gz" else open(p, "rb")) as f:
+                first = f.readline().decode("utf-8-sig", errors="replace")
+        except (OSError, EOFError):
+            return [], []
+        # read_csv_auto strips surrounding whitespace from header names too
+        names = [c.strip() for c in next(csv.reader([first], delimiter=sep), [])]
+        cached = _header_cache[key] = (names, [c.lower() for c in names])
+    return cached
+
+def _read_header(p: Path, sep: str) -> list[str]:
+    return _header(p, sep)[1]
+
+# Required header columns per file kind, checked as set subsets
+_OFFER_COLS = ("id","title","description","price","pricecurrency","brand")
+_OFFER_KEYS = frozenset(_OFFER_COLS)
+_PAIR_KEYS = frozenset(("left_id","right_id","label"))
+_MC_OFFER_KEYS = ("offer_id","id","item_id")
+
+def _sep_for(p: Path) -> str:
+    # pairs.tsv.gz is tab-separated too
+    suffix = Path(p.stem).suffix if p.suffix == ".gz" else p.suffix
+    return "\t" if suffix == ".tsv" else ","
+
+def _list_files(dirpath: Path) -> list[Path]:
+    # One directory read shared by all detectors; like Path.glob, dotfiles are included
+    with os.scandir(dirpath) as it:
+        return [Path(e.path) for e in it if e.is_file()]
+
+def _matching(files: list[Path], *patterns: str) -> list[Path]:
+    # Files matching any pattern, grouped in pattern order like the concatenated globs were
+    return list(dict.fromkeys(p for pat in patterns for p in files if fnmatchcase(p.name, pat)))
+
+def _detect_offers_file(files: list[Path]) -> Path|None:
+    for p in _matching(files, "*.csv", "*.tsv"):
+        if _OFFER_KEYS.issubset(_read_header(p, _sep_for(p))):
             return p
     return None
 
-def _detect_pairs_file(dirpath: Path) -> Path|None:
-    for p in list(dirpath.glob("pairs.*")) + list(dirpath.glob("*pairs*.csv")) + list(dirpath.glob("*pairs*.tsv")):
-        try:
-            head = pd.read_csv(p, nrows=5) if p.suffix != ".tsv" else pd.read_csv(p, nrows=5, sep="\t")
-        except Exception:
-            continue
-        cols = [c.lower() for c in head.columns]
-        if all(k in cols for k in ["left_id","right_id","label"]):
+def _detect_pairs_file(files: list[Path]) -> Path|None:
+    for p in _matching(files, "pairs.*", "*pairs*.csv", "*pairs*.tsv"):
+        if _PAIR_KEYS.issubset(_read_header(p, _sep_for(p))):
             return p
     # heuristic fallback
-    for p in dirpath.glob("*.csv"):
-        head = pd.read_csv(p, nrows=5)
-        cols = [c.lower() for c in head.columns]
-        if all(k in cols for k in ["left_id","right_id","label"]):
+    for p in _matching(files, "*.csv"):
+        if _PAIR_KEYS.issubset(_read_header(p, ",")):
             return p
     return None
 
-def _detect_multiclass_file(dirpath: Path) -> Path|None:
-    for p in list(dirpath.glob("*offer_to_entity*.csv")) + list(dirpath.glob("*offer*entity*.csv")) + list(dirpath.glob("*multi*.csv")):
-        try:
-            head = pd.read_csv(p, nrows=5)
-        except Exception:
-            continue
-        cols = [c.lower() for c in head.columns]
-        if any(k in cols for k in ["offer_id","id","item_id"]) and any("entity" in c.lower() for c in cols):
+def _detect_multiclass_file(files: list[Path]) -> Path|None:
+    for p in _matching(files, "*offer_to_entity*.csv", "*offer*entity*.csv", "*multi*.csv"):
+        cols = _read_header(p, ",")
+        if any(k in cols for k in _MC_OFFER_KEYS) and any("entity" in c for c in cols):
             return p
     return None
 
+def _varchar_types(cols) -> dict[str, str]:
+    # read_csv_auto types= for the columns the INSERTs use. Sniffed types come from a sample, so an id
+    # or price that only turns non-numeric deep into the file would abort the load; the SQL casts anyway.
+    return {c: "VARCHAR" for c in cols}
+
 def load_wdc_variant(con, variant_dir: str, variant_name: str|None=None, split: str|None=None):
+    # Offers, pairs and entity links are scanned and transformed inside DuckDB (read_csv_auto), no pandas.
+    # normalize_text/parse_price_currency are the UDFs registered by connect_duckdb.
     d = Path(variant_dir)
-    offers_file = _detect_offers_file(d)
+    files = _list_files(d)
+    offers_file = _detect_offers_file(files)
     if not offers_file:
         raise FileNotFoundError(f"No offers file with expected columns found in {variant_dir}")
-    is_tsv = offers_file.suffix == ".tsv"
-    offers = pd.read_csv(offers_file, sep="\t" if is_tsv else ",", low_memory=False)
-    offers.columns = [c.strip().lower() for c in offers.columns]
-
-    rows = []
-    for _, r in offers.iterrows():
-        oid = str(r["id"])
-        price, currency = parse_price_currency(r.get("price"))
-        rows.append(dict(
-            item_id = md5_id("wdc", oid),
-            dataset = "wdc",
-            dataset_item_key = oid,
-            merchant = None,
-            site = None,
-            locale = None,
-            brand = r.get("brand"),
-            title = normalize_text(r.get("title")),
-            description = normalize_text(r.get("description")),
-            bullet_points = None,
-            color = None,
-            price = price,
-            currency = r.get("pricecurrency") or currency,
-            category = None,
-            image_url = None,
-            attrs = to_json_text({k:v for k,v in r.items() if k not in ("id","title","description","price","pricecurrency","brand")}),
-            split = split,
-            variant = variant_name,
-            version = "2024"
-        ))
-    items_df = pd.DataFrame(rows)
-    append_df(con, "items", items_df)
+    offers_src = "read_csv_auto(?, delim=?, header=true, types=?)"
+    offers_params = [str(offers_file), _sep_for(offers_file), _varchar_types(_OFFER_COLS)]
+    offer_names = describe_columns(con, offers_src, offers_params)
+
+    con.execute(f"""
+        INSERT INTO items
+        SELECT
+            md5(concat('wdc|', id, '|')) AS item_id,
+            'wdc' AS dataset,
+            CAST(id AS VARCHAR) AS dataset_item_key,
+            NULL AS merchant,
+            NULL AS site,
+            NULL AS locale,
+            brand,
+            normalize_text(title) AS title,
+            normalize_text(description) AS description,
+            NULL AS bullet_points,
+            NULL AS color,
+            _parsed.price AS price,
+            coalesce(nullif(CAST(pricecurrency AS VARCHAR), ''), _parsed.currency) AS currency,
+            NULL AS category,
+            NULL AS image_url,
+            {attrs_sql(offer_names, _OFFER_COLS)} AS attrs,
+            ?::VARCHAR AS split,
+            ?::VARCHAR AS variant,
+            '2024' AS version
+        FROM (SELECT *, parse_price_currency(CAST(price AS VARCHAR)) AS _parsed FROM {offers_src})
+    """, [split, variant_name, *offers_params])
 
     # Pairs (if present)
-    pf = _detect_pairs_file(d)
+    pf = _detect_pairs_file(files)
     if pf:
-        head = pd.read_csv(pf, nrows=5) if pf.suffix != ".tsv" else pd.read_csv(pf, nrows=5, sep="\t")
-        cols = [c.lower() for c in head.columns]
-        sep = "\t" if pf.suffix == ".tsv" else ","
-        pairs = pd.read_csv(pf, sep=sep)
-        pairs.columns = [c.strip().lower() for c in pairs.columns]
-        lcol = "left_id"
-        rcol = "right_id"
-        lab = "label"
-        prow = []
-        for _, r in pairs.iterrows():
-            prow.append(dict(
-                left_item_id = md5_id("wdc", str(r[lcol])),
-                right_item_id = md5_id("wdc", str(r[rcol])),
-                label = str(r[lab]).lower() if pd.notna(r[lab]) else None,
-                pair_source = "benchmark",
-                split = split,
-                variant = variant_name
-            ))
-        append_df(con, "item_item_pairs", pd.DataFrame(prow))
+        con.execute("""
+            INSERT INTO item_item_pairs
+            SELECT
+                md5(concat('wdc|', left_id, '|')) AS left_item_id,
+                md5(concat('wdc|', right_id, '|')) AS right_item_id,
+                lower(CAST(label AS VARCHAR)) AS label,
+                'benchmark' AS pair_source,
+                ?::VARCHAR AS split,
+                ?::VARCHAR AS variant
+            FROM read_csv_auto(?, delim=?, header=true, types=?)
+        """, [split, variant_name, str(pf), _sep_for(pf), _varchar_types(_PAIR_KEYS)])
 
     # Multi-class (if present)
-    mf = _detect_multiclass_file(d)
+    mf = _detect_multiclass_file(files)
     if mf:
-        mc = pd.read_csv(mf)
-        mc.columns = [c.strip().lower() for c in mc.columns]
+        names = _header(mf, ",")[0]
+        # The header sniffed during detection is reused; DuckDB renames empty/duplicate names, so ask it then
+        if not all(names) or len(set(names)) != len(names):
+            names = describe_columns(con, "read_csv_auto(?, header=true)", [str(mf)])
+        mc_cols = {c.strip().lower(): c for c in names}
         # Try common column names
-        offer_col = next((c for c in mc.columns if c in ("offer_id","id","item_id")), None)
-        ent_col = next((c for c in mc.columns if "entity" in c), None)
+        offer_col = next((mc_cols[c] for c in mc_cols if c in _MC_OFFER_KEYS), None)
+        ent_col = next((mc_cols[c] for c in mc_cols if "entity" in c), None)
         if offer_col and ent_col:
+            mc_src = "read_csv_auto(?, header=true, types=?)"
+            mc_params = [str(mf), _varchar_types((offer_col, ent_col))]
+            offer_col, ent_col = sql_ident(offer_col), sql_ident(ent_col)
             # entities
-            ent_ids = mc[ent_col].astype(str).unique().tolist()
-            ent_df = pd.DataFrame([dict(entity_id=f"wdc:{e}", dataset="wdc", notes=variant_name) for e in ent_ids])
-            append_df(con, "entities", ent_df)
+            con.execute(f"""
+                INSERT INTO entities
+                SELECT DISTINCT concat('wdc:', {ent_col}) AS entity_id, 'wdc' AS dataset, ?::VARCHAR AS notes
+                FROM {mc_src}
+            """, [variant_name, *mc_params])
             # links
-            link_rows = []
-            for _, r in mc.iterrows():
-                link_rows.append(dict(
-                    item_id = md5_id("wdc", str(r[offer_col])),
-                    entity_id = f"wdc:{str(r[ent_col])}"
-                ))
-            append_df(con, "item_entity", pd.DataFrame(link_rows))
+            con.execute(f"""
+                INSERT INTO item_entity
+                SELECT md5(concat('wdc|', {offer_col}, '|')) AS item_id, concat('wdc:', {ent_col}) AS entity_id
+                FROM {mc_src}
+            """, mc_params)
+
+# Split names recognised inside variant folder names; the first one contained in the name wins
+_SPLIT_TOKENS = ("train","val","valid","validation","test","dev")
+
+def _split_from_name(name: str) -> str|None:
+    # try to infer split from folder name
+    low = name.lower()
+    return next((tok for tok in _SPLIT_TOKENS if tok in low), None)
 
 def load_wdc(con, base_dir: str):
     base = Path(base_dir)
@@ -141,11 +174,4 @@ def load_wdc(con, base_dir: str):
         load_wdc_variant(con, str(base), variant_name=base.name, split=None)
     else:
         for s in subs:
-            # try to infer split from folder name
-            split = None
-            name = s.name
-            for tok in ("train","val","valid","validation","test","dev"):
-                if tok in name.lower():
-                    split = tok
-                    break
-            load_wdc_variant(con, str(s), variant_name=name, split=split)
+            load_wdc_variant(con, str(s), variant_name=s.name, split=_split_from_name(s.name))
@@ -3,16 +3,19 @@ import argparse, sys
 from pathlib import Path
 import duckdb
 
-from etl.utils import connect_duckdb
+from etl.utils import connect_duckdb, transaction
 from etl.abt_buy import load_abt_buy
 from etl.cikm16 import load_cikm16
 from etl.esci import load_esci
 from etl.wdc_products import load_wdc
 
 def ensure_schema(con, ddl_path: str):
+    # The one place tables are created; loaders assume they exist. All-or-nothing, so a
+    # failing statement cannot leave a partial schema behind
     with open(ddl_path, "r") as f:
         sql = f.read()
-    con.execute(sql)
+    with transaction(con):
+        con.execute(sql)
 
 def main():
     ap = argparse.ArgumentParser(description="Unify Abt-Buy, CIKM16, ESCI, and WDC Products into one DB")
@@ -31,16 +34,20 @@ def main():
 
     if "abt_buy" in args.load:
         print("Loading Abt-Buy...")
-        load_abt_buy(con, args.abt_dir)
+        with transaction(con):
+            load_abt_buy(con, args.abt_dir)
     if "cikm16" in args.load:
         print("Loading CIKM16/DIGINETICA... (this can take a while)")
-        load_cikm16(con, args.cikm_dir)
+        with transaction(con):
+            load_cikm16(con, args.cikm_dir)
     if "esci" in args.load:
         print("Loading ESCI...")
-        load_esci(con, args.esci_dir)
+        with transaction(con):
+            load_esci(con, args.esci_dir)
     if "wdc" in args.load:
         print("Loading WDC Products...")
-        load_wdc(con, args.wdc_dir)
+        with transaction(con):
+            load_wdc(con, args.wdc_dir)
 
     print("Done. DB at:", args.db)
 